@@ -1,64 +1,128 @@
+import math
+from functools import lru_cache
+
 import dash
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, Patch, ctx
 import plotly.graph_objects as go
 import numpy as np
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
 
-# Lorentz transformation function
-def lorentz_transform(t, x, v):
-    gamma = 1 / np.sqrt(1 - v**2)
+# Lorentz factor for velocity v (fraction of c)
+def lorentz_factor(v):
+    return 1.0 / math.sqrt(1.0 - v * v)
+
+# Lorentz transformation function; gamma is lorentz_factor(v), computed once by the caller
+def lorentz_transform(t, x, v, gamma):
     t_prime = gamma * (t - v * x)
     x_prime = gamma * (x - v * t)
     return t_prime, x_prime
 
+# Coordinates handed to Plotly are float32, which halves the data sent to the browser
+plot_dtype = np.float32
+
+# Join the rows of 2D line arrays into single NaN-separated polylines,
+# so a whole family of grid lines can be drawn as one trace
+def join_lines(x_lines, y_lines):
+    gap = np.full((x_lines.shape[0], 1), np.nan, dtype=x_lines.dtype)
+    return np.column_stack([x_lines, gap]).ravel(), np.column_stack([y_lines, gap]).ravel()
+
+# Lorentz-transform a 2D grid of lines (t and x broadcast against each other, one line per row)
+# straight into flat NaN-separated (t', x') polylines like join_lines produces. The results are
+# written through ufunc out= arguments into two plot_dtype buffers, the only allocations.
+def transform_lines(t, x, v, gamma):
+    n_lines, n_points = np.broadcast_shapes(np.shape(t), np.shape(x))
+    t_lines = np.full((n_lines, n_points + 1), np.nan, dtype=plot_dtype)
+    x_lines = np.full((n_lines, n_points + 1), np.nan, dtype=plot_dtype)
+    t_prime, x_prime = t_lines[:, :-1], x_lines[:, :-1]
+    np.multiply(v, x, out=t_prime)
+    np.subtract(t, t_prime, out=t_prime)
+    t_prime *= gamma
+    np.multiply(v, t, out=x_prime)
+    np.subtract(x, x_prime, out=x_prime)
+    x_prime *= gamma
+    return t_lines.ravel(), x_lines.ravel()
+
 # Generate a fixed grid for reference
 time_range = np.linspace(-5, 5, 11)
 space_range = np.linspace(-5, 5, 11)
 
+# Constant background grid in light gray (untransformed), constant-t rows followed by constant-x rows
+def generate_reference_grid():
+    grid_t, grid_x = np.broadcast_arrays(time_range[:, None], space_range[None, :])
+    gray_x, gray_y = join_lines(np.vstack([grid_x, grid_x.T]), np.vstack([grid_t, grid_t.T]))
+    return [go.Scattergl(x=gray_x, y=gray_y, mode='lines', line=dict(color='lightgray', width=0.5), showlegend=False)]
+
+# The reference grid does not depend on velocity, so build it once for all callbacks
+reference_grid_traces = generate_reference_grid()
+
+# Light cones (x = t and x = -t) are velocity-independent too; as straight lines, two endpoints each
+light_cone_traces = [
+    go.Scattergl(x=[-5, 5], y=[-5, 5], mode="lines", line=dict(dash="dash", color="green"), showlegend=False),
+    go.Scattergl(x=[-5, 5], y=[5, -5], mode="lines", line=dict(dash="dash", color="green"), showlegend=False)
+]
+
+# Transformed grid lines as NaN-separated (red_x, red_y, blue_x, blue_y) arrays: red rows are the
+# lines t = time_range[i], blue rows the lines x = space_range[j].
+# Results are memoized per velocity, so callbacks that keep the velocity skip the transform.
+@lru_cache(maxsize=512)
+def generate_transformed_grid_lines(velocity):
+    gamma = lorentz_factor(velocity)
+    red_y, red_x = transform_lines(time_range[:, None], space_range[None, :], velocity, gamma)
+    # The blue lines run through the same grid points as the red ones, column by column, so they are
+    # read off the transformed red lines transposed instead of being transformed a second time
+    red_shape = (len(time_range), len(space_range) + 1)
+    blue_x, blue_y = join_lines(red_x.reshape(red_shape)[:, :-1].T, red_y.reshape(red_shape)[:, :-1].T)
+    return red_x, red_y, blue_x, blue_y
+
+# Transform the stored (x, t) grid points into (x', t') marker coordinates in one vectorized call
+# (points are snapped integer coordinates of clicked trace points, so a small integer dtype suffices)
+def transform_points(points, velocity):
+    points_xt = np.asarray(points, dtype=np.int16).reshape(-1, 2)
+    t_transformed, x_transformed = lorentz_transform(points_xt[:, 1], points_xt[:, 0], velocity, lorentz_factor(velocity))
+    return x_transformed.astype(plot_dtype), t_transformed.astype(plot_dtype)
+
+# Trace indices in the figure built by create_figure, used by the partial updates in update_graph
+red_grid_trace = len(reference_grid_traces)
+blue_grid_trace = red_grid_trace + 1
+points_trace = blue_grid_trace + len(light_cone_traces) + 1
+
+# Title shown above the plot for a given velocity
+def figure_title(velocity):
+    return f"Lorentz Transformation with Relative Velocity = {velocity:.2f}c"
+
 # Create the initial plot layout
 def create_figure(velocity=0.5, points=None, color='purple', size=8):
     if points is None:
         points = []
 
-    fig = go.Figure()
-
     # Constant background grid in light gray (untransformed)
-    for t in time_range:
-        fig.add_trace(go.Scatter(x=space_range, y=[t]*len(space_range), mode='lines', line=dict(color='lightgray', width=0.5), showlegend=False))
-    for x in space_range:
-        fig.add_trace(go.Scatter(x=[x]*len(time_range), y=time_range, mode='lines', line=dict(color='lightgray', width=0.5), showlegend=False))
-
-    # Transformed grid lines in red and blue
-    for t in time_range:
-        t_transformed, x_transformed = lorentz_transform(t * np.ones_like(space_range), space_range, velocity)
-        fig.add_trace(go.Scatter(x=x_transformed, y=t_transformed, mode='lines', line=dict(color='red', width=1), showlegend=False))
+    traces = list(reference_grid_traces)
 
-    for x in space_range:
-        t_transformed, x_transformed = lorentz_transform(time_range, x * np.ones_like(time_range), velocity)
-        fig.add_trace(go.Scatter(x=x_transformed, y=t_transformed, mode='lines', line=dict(color='blue', width=1), showlegend=False))
+    # Transformed grid lines in red and blue, keyed on the slider-step velocity
+    red_x, red_y, blue_x, blue_y = generate_transformed_grid_lines(round(velocity, 3))
+    traces.append(go.Scattergl(x=red_x, y=red_y, mode='lines', line=dict(color='red', width=1), showlegend=False))
+    traces.append(go.Scattergl(x=blue_x, y=blue_y, mode='lines', line=dict(color='blue', width=1), showlegend=False))
 
     # Add light cones
-    time_values = np.linspace(-5, 5, 100)
-    fig.add_trace(go.Scatter(x=time_values, y=time_values, mode="lines", line=dict(dash="dash", color="green"), showlegend=False))
-    fig.add_trace(go.Scatter(x=time_values, y=-time_values, mode="lines", line=dict(dash="dash", color="green"), showlegend=False))
+    traces.extend(light_cone_traces)
 
-    # Plot each transformed point
-    for x_point, t_point in points:
-        t_transformed, x_transformed = lorentz_transform(t_point, x_point, velocity)
-        fig.add_trace(go.Scatter(x=[x_transformed], y=[t_transformed], mode="markers", marker=dict(color=color, size=size), showlegend=False))
+    # Plot all transformed points as a single markers trace
+    points_x, points_t = transform_points(points, velocity)
+    traces.append(go.Scattergl(x=points_x, y=points_t, mode="markers", marker=dict(color=color, size=size), showlegend=False))
 
     # Layout adjustments
-    fig.update_layout(
-        xaxis_title="Space (x)",
-        yaxis_title="Time (t)",
-        xaxis=dict(range=[-5, 5], autorange=False),
-        yaxis=dict(range=[-5, 5], autorange=False),
-        title=f"Lorentz Transformation with Relative Velocity = {velocity:.2f}c",
-        dragmode="pan"
+    layout = go.Layout(
+        xaxis=dict(title="Space (x)", range=[-5, 5], autorange=False),
+        yaxis=dict(title="Time (t)", range=[-5, 5], autorange=False),
+        title=figure_title(velocity),
+        dragmode="pan",
+        uirevision='static'  # keep zoom and pan when callbacks patch the title and traces
     )
     
+    # Build the figure in one call, so the trace list is validated once
+    fig = go.Figure(data=traces, layout=layout)
     return fig
 
 # App layout
@@ -75,8 +139,8 @@ app.layout = html.Div([
     html.Label("Point Size"),
     dcc.Input(id='point-size', type='number', value=8),
     
-    # Graph display
-    dcc.Graph(id='lorentz-graph', config={'scrollZoom': True}),
+    # Graph display, pre-built for the initial control values; callbacks only patch it
+    dcc.Graph(id='lorentz-graph', figure=create_figure(0.5, [], 'purple', 8), config={'scrollZoom': True}),
     
     # Hidden div to store clicked points
     dcc.Store(id='points-storage', data=[])
@@ -90,7 +154,8 @@ app.layout = html.Div([
     Input('lorentz-graph', 'clickData'),
     Input('point-color', 'value'),
     Input('point-size', 'value'),
-    State('points-storage', 'data')
+    State('points-storage', 'data'),
+    prevent_initial_call=True
 )
 def update_graph(velocity, click_data, color, size, points):
     # Initialize points list if empty
@@ -98,24 +163,39 @@ def update_graph(velocity, click_data, color, size, points):
         points = []
 
     # Process clickData to add or remove points at grid intersections
-    if click_data:
+    if ctx.triggered_id == 'lorentz-graph' and click_data:
         click_x = click_data['points'][0]['x']
         click_y = click_data['points'][0]['y']
         
-        # Snap click to nearest grid intersection (original, untransformed coordinates)
-        snap_x = round(click_x)
-        snap_y = round(click_y)
-
-        # Toggle the point: add if not in list, remove if already present
-        clicked_point = (snap_x, snap_y)
-        if clicked_point in points:
-            points.remove(clicked_point)  # Remove point if it's already plotted
-        else:
-            points.append(clicked_point)  # Add point if not already plotted
-
-    # Create updated figure with transformed points
-    fig = create_figure(velocity, points, color, size)
-    return fig, points
+        # Snap click to nearest grid intersection (original, untransformed coordinates);
+        # grid coordinates are integers, so the snapped point compares exactly
+        snap_x, snap_y = np.rint([click_x, click_y]).astype(int).tolist()
+
+        # Toggle the point: add if not stored, remove if already present.
+        # dcc.Store hands points back as JSON lists, so compare them as a set of tuples.
+        point_set = set(map(tuple, points))
+        point_set ^= {(snap_x, snap_y)}
+        points = list(point_set)
+
+    # Patch just the traces affected by the input that fired; the reference grid
+    # and light cones never change, so they are never sent again
+    patched = Patch()
+    if ctx.triggered_id == 'velocity-slider':
+        red_x, red_y, blue_x, blue_y = generate_transformed_grid_lines(round(velocity, 3))
+        patched['data'][red_grid_trace]['x'] = red_x
+        patched['data'][red_grid_trace]['y'] = red_y
+        patched['data'][blue_grid_trace]['x'] = blue_x
+        patched['data'][blue_grid_trace]['y'] = blue_y
+        patched['layout']['title']['text'] = figure_title(velocity)
+    if ctx.triggered_id in ('velocity-slider', 'lorentz-graph'):
+        points_x, points_t = transform_points(points, velocity)
+        patched['data'][points_trace]['x'] = points_x
+        patched['data'][points_trace]['y'] = points_t
+    if ctx.triggered_id == 'point-color':
+        patched['data'][points_trace]['marker']['color'] = color
+    if ctx.triggered_id == 'point-size':
+        patched['data'][points_trace]['marker']['size'] = size
+    return patched, points
 
 # Run the app
 if __name__ == '__main__':
@@ -1,7 +1,10 @@
+import linecache
+import math
+from functools import partial
+
 import streamlit as st
 import numpy as np
 import plotly.graph_objects as go
-from sympy import symbols, lambdify, sympify
 
 # Title of the app
 st.title("Interactive Lorentz Transformation Tool with Optional Curve Plotting")
@@ -11,72 +14,175 @@ st.sidebar.header("Lorentz Transformation Controls")
 
 # Velocity input options: slider and text box
 velocity_slider = st.sidebar.slider("Relative Velocity (as a fraction of the speed of light, c)", -0.99, 0.99, 0.5)
+# The text box defaults to the slider value, so its value is the velocity either way; it is
+# quantized to the 0.01c input step: finer differences are not visible in the grid,
+# and equal quantized velocities hit the same cached traces
 velocity_input = st.sidebar.number_input("Or enter velocity directly:", min_value=-0.99, max_value=0.99, value=velocity_slider, step=0.01)
-velocity = velocity_input if velocity_input != velocity_slider else velocity_slider
-
-# Lorentz transformation function
-def lorentz_transform(t, x, v):
-    gamma = 1 / np.sqrt(1 - v**2)
-    t_prime = gamma * (t - v * x)
-    x_prime = gamma * (x - v * t)
-    return t_prime, x_prime
-
-# Function to generate transformed grid lines
+velocity = round(velocity_input, 2)
+
+# Lorentz factor for velocity v (fraction of c)
+def lorentz_factor(v):
+    return 1.0 / math.sqrt(1.0 - v * v)
+
+# In-place Lorentz transform into preallocated outputs
+def lorentz_transform_into(t, x, v, gamma, out_t, out_x):
+    np.multiply(v, x, out=out_t)
+    np.subtract(t, out_t, out=out_t)
+    out_t *= gamma
+    np.multiply(v, t, out=out_x)
+    np.subtract(x, out_x, out=out_x)
+    out_x *= gamma
+
+# Fixed grid and sampling ranges shared by every rerun
+time_range = np.linspace(-5, 5, 11)
+space_range = np.linspace(-5, 5, 11)
+curve_range = np.linspace(-5, 5, 50)  # curve samples; denser steps are not visible at plot resolution
+axis_range = np.array([-5.0, 5.0])  # endpoints are enough for straight lines
+axis_zeros = np.zeros(2)
+# Coordinates handed to Plotly are float32, which halves the data sent to the browser
+plot_dtype = np.float32
+
+# Join the rows of 2D line arrays into single NaN-separated polylines,
+# so a whole family of grid lines can be drawn as one trace
+def join_lines(x_lines, y_lines):
+    gap = np.full((x_lines.shape[0], 1), np.nan, dtype=x_lines.dtype)
+    return np.column_stack([x_lines, gap]).ravel(), np.column_stack([y_lines, gap]).ravel()
+
+# Lorentz-transform a 2D grid of lines (t and x broadcast against each other, one line per row)
+# straight into flat NaN-separated (t', x') polylines like join_lines produces. The results are
+# written through ufunc out= arguments into two plot_dtype buffers, the only allocations.
+def transform_lines(t, x, v, gamma):
+    n_lines, n_points = np.broadcast_shapes(np.shape(t), np.shape(x))
+    t_lines = np.full((n_lines, n_points + 1), np.nan, dtype=plot_dtype)
+    x_lines = np.full((n_lines, n_points + 1), np.nan, dtype=plot_dtype)
+    t_prime, x_prime = t_lines[:, :-1], x_lines[:, :-1]
+    np.multiply(v, x, out=t_prime)
+    np.subtract(t, t_prime, out=t_prime)
+    t_prime *= gamma
+    np.multiply(v, t, out=x_prime)
+    np.subtract(x, x_prime, out=x_prime)
+    x_prime *= gamma
+    return t_lines.ravel(), x_lines.ravel()
+
+# Coordinate workspace for transform_segments: float64 rows for the concatenated t, x and their
+# transforms, and plot_dtype rows for the transforms handed to Plotly. It is reused across reruns
+# and kept per session, since module-level buffers would be shared by concurrent sessions.
+def get_workspace(n):
+    workspace = st.session_state.get('workspace')
+    if workspace is None or workspace[0].shape[1] < n:
+        size = max(n, 256)
+        workspace = st.session_state['workspace'] = (np.empty((4, size)), np.empty((2, size), dtype=plot_dtype))
+    coords, plot_coords = workspace
+    return coords[:, :n], plot_coords[:, :n]
+
+# Lorentz-transform named (t, x) coordinate segments in one fused call over their concatenation,
+# returning each segment's (t', x') slice of the result under the same name. The slices are views
+# of the workspace, valid until the next rerun (Plotly copies arrays assigned to traces).
+def transform_segments(segments, v, gamma):
+    sizes = [len(t) for t, _ in segments.values()]
+    coords, plot_coords = get_workspace(sum(sizes))
+    t_all, x_all, t_prime, x_prime = coords
+    np.concatenate([t for t, _ in segments.values()], out=t_all)
+    np.concatenate([x for _, x in segments.values()], out=x_all)
+    lorentz_transform_into(t_all, x_all, v, gamma, t_prime, x_prime)
+    # Clip to the plot_dtype range first, so huge off-screen curve values don't overflow the cast
+    plot_limit = np.finfo(plot_dtype).max
+    np.clip(coords[2:], -plot_limit, plot_limit, out=plot_coords)
+    bounds = np.cumsum(sizes)[:-1]
+    t_plot, x_plot = plot_coords
+    return dict(zip(segments, zip(np.split(t_plot, bounds), np.split(x_plot, bounds))))
+
+# Function to generate transformed grid lines, cached per velocity as plain trace dicts
+# so reruns that leave the velocity unchanged skip the transform. The slider has 199 positions;
+# the bound keeps free-form alignment velocities from growing the cache without limit.
+@st.cache_data(max_entries=256)
 def generate_transformed_grid_lines(velocity):
     grid_lines = []
-    time_range = np.linspace(-5, 5, 11)
-    space_range = np.linspace(-5, 5, 11)
-
-    # Transformed grid lines in red and blue
-    for t in time_range:
-        t_transformed, x_transformed = lorentz_transform(t * np.ones_like(space_range), space_range, velocity)
-        grid_lines.append(go.Scatter(x=x_transformed, y=t_transformed, mode='lines', line=dict(color='red', width=1), showlegend=False))
-
-    for x in space_range:
-        t_transformed, x_transformed = lorentz_transform(time_range, x * np.ones_like(time_range), velocity)
-        grid_lines.append(go.Scatter(x=x_transformed, y=t_transformed, mode='lines', line=dict(color='blue', width=1), showlegend=False))
 
-    return grid_lines
-
-# Function to generate fixed vertical reference grid lines and original axes with gray highlight
+    # Transformed grid lines in red and blue: red rows are the lines t = time_range[i],
+    # blue rows the lines x = space_range[j]
+    gamma = lorentz_factor(velocity)
+    red_y, red_x = transform_lines(time_range[:, None], space_range[None, :], velocity, gamma)
+    grid_lines.append(go.Scattergl(x=red_x, y=red_y, mode='lines', line=dict(color='red', width=1), showlegend=False, uid='grid-red'))
+    # The blue lines run through the same grid points as the red ones, column by column, so they are
+    # read off the transformed red lines transposed instead of being transformed a second time
+    red_shape = (len(time_range), len(space_range) + 1)
+    blue_x, blue_y = join_lines(red_x.reshape(red_shape)[:, :-1].T, red_y.reshape(red_shape)[:, :-1].T)
+    grid_lines.append(go.Scattergl(x=blue_x, y=blue_y, mode='lines', line=dict(color='blue', width=1), showlegend=False, uid='grid-blue'))
+
+    return [trace.to_plotly_json() for trace in grid_lines]
+
+# Function to generate fixed vertical reference grid lines and original axes with gray highlight.
+# None of it depends on velocity, so it is built once and served from the cache as plain trace dicts.
+@st.cache_data
 def generate_reference_grid():
     grid_lines = []
-    time_range = np.linspace(-5, 5, 11)
-    space_range = np.linspace(-5, 5, 11)
-
-    # Vertical and horizontal gray reference lines for static frame
-    for x in space_range:
-        grid_lines.append(go.Scatter(x=x * np.ones_like(time_range), y=time_range, mode='lines', line=dict(color='lightgray', width=0.5), showlegend=False))
-    for t in time_range:
-        grid_lines.append(go.Scatter(x=space_range, y=t * np.ones_like(space_range), mode='lines', line=dict(color='lightgray', width=0.5), showlegend=False))
+
+    # Vertical and horizontal gray reference lines for static frame, as one trace;
+    # each straight line only needs its two endpoints, e.g. x=[x, x], y=[-5, 5]
+    vertical_x, vertical_y = np.broadcast_arrays(space_range[:, None], axis_range[None, :])
+    horizontal_x, horizontal_y = np.broadcast_arrays(axis_range[None, :], time_range[:, None])
+    gray_x, gray_y = join_lines(np.vstack([vertical_x, horizontal_x]), np.vstack([vertical_y, horizontal_y]))
+    grid_lines.append(go.Scattergl(x=gray_x, y=gray_y, mode='lines', line=dict(color='lightgray', width=0.5), showlegend=False))
     # Gray highlight for original t and x axes in the reference frame
-    grid_lines.append(go.Scatter(x=[0, 0], y=[-5, 5], mode='lines', line=dict(color='rgba(200, 200, 200, 0.3)', width=10), showlegend=False))
-    grid_lines.append(go.Scatter(x=[-5, 5], y=[0, 0], mode='lines', line=dict(color='rgba(200, 200, 200, 0.3)', width=10), showlegend=False))
+    grid_lines.append(go.Scattergl(x=[0, 0], y=[-5, 5], mode='lines', line=dict(color='rgba(200, 200, 200, 0.3)', width=10), showlegend=False))
+    grid_lines.append(go.Scattergl(x=[-5, 5], y=[0, 0], mode='lines', line=dict(color='rgba(200, 200, 200, 0.3)', width=10), showlegend=False))
 
     # Original reference axes on top of highlight
-    grid_lines.append(go.Scatter(x=[0, 0], y=[-5, 5], mode='lines', line=dict(color='gray', width=2, dash='dot'), name="Reference t-axis"))
-    grid_lines.append(go.Scatter(x=[-5, 5], y=[0, 0], mode='lines', line=dict(color='gray', width=2, dash='dot'), name="Reference x-axis"))
+    grid_lines.append(go.Scattergl(x=[0, 0], y=[-5, 5], mode='lines', line=dict(color='gray', width=2, dash='dot'), name="Reference t-axis"))
+    grid_lines.append(go.Scattergl(x=[-5, 5], y=[0, 0], mode='lines', line=dict(color='gray', width=2, dash='dot'), name="Reference x-axis"))
     
-    return grid_lines
+    return [trace.to_plotly_json() for trace in grid_lines]
 
-# Function to generate transformed frame axes with yellow highlight
-def generate_transformed_axes(velocity):
+# Function to generate transformed frame axes with yellow highlight, from the transformed
+# (t', x') endpoints of the t-axis and x-axis
+def generate_transformed_axes(t_axis, x_axis):
     # Transformed t'-axis (x=0)
-    t_range = np.linspace(-5, 5, 100)
-    t_prime, x_prime = lorentz_transform(t_range, np.zeros_like(t_range), velocity)
+    t_prime, x_prime = t_axis
     transformed_axes = [
-        go.Scatter(x=x_prime, y=t_prime, mode='lines', line=dict(color='rgba(255, 255, 0, 0.3)', width=10), showlegend=False),
-        go.Scatter(x=x_prime, y=t_prime, mode='lines', line=dict(color='red', width=2, dash='dash'), name="Transformed t'-axis")
+        go.Scattergl(x=x_prime, y=t_prime, mode='lines', line=dict(color='rgba(255, 255, 0, 0.3)', width=10), showlegend=False, uid='t-axis-highlight'),
+        go.Scattergl(x=x_prime, y=t_prime, mode='lines', line=dict(color='red', width=2, dash='dash'), name="Transformed t'-axis", uid='t-axis')
     ]
 
     # Transformed x'-axis (t=0)
-    x_range = np.linspace(-5, 5, 100)
-    t_prime, x_prime = lorentz_transform(np.zeros_like(x_range), x_range, velocity)
-    transformed_axes.append(go.Scatter(x=x_prime, y=t_prime, mode='lines', line=dict(color='rgba(255, 255, 0, 0.3)', width=10), showlegend=False))
-    transformed_axes.append(go.Scatter(x=x_prime, y=t_prime, mode='lines', line=dict(color='blue', width=2, dash='dash'), name="Transformed x'-axis"))
+    t_prime, x_prime = x_axis
+    transformed_axes.append(go.Scattergl(x=x_prime, y=t_prime, mode='lines', line=dict(color='rgba(255, 255, 0, 0.3)', width=10), showlegend=False, uid='x-axis-highlight'))
+    transformed_axes.append(go.Scattergl(x=x_prime, y=t_prime, mode='lines', line=dict(color='blue', width=2, dash='dash'), name="Transformed x'-axis", uid='x-axis'))
     
     return transformed_axes
 
+# Compile a curve expression in x into a NumPy function. SymPy parsing and code generation dominate
+# the curve cost, so each expression string is compiled once and the function reused across reruns.
+# SymPy is imported here rather than at the top, so sessions without a curve never load it.
+@st.cache_resource(max_entries=64)
+def compile_curve(expr):
+    from sympy import Poly, preorder_traversal, symbols, lambdify, sympify
+
+    x = symbols('x')
+    expression = sympify(expr)
+    # Expanded real polynomials are evaluated with np.polyval; everything else is lambdified
+    terms = expression.args if expression.is_Add else (expression,)
+    expanded = not any(node.is_Add for term in terms for node in preorder_traversal(term))
+    if expanded and expression.free_symbols <= {x} and expression.is_polynomial(x):
+        coeffs = Poly(expression, x).all_coeffs()
+        if all(c.is_real for c in coeffs):
+            return partial(np.polyval, np.array(coeffs, dtype=float))
+    curve_function = lambdify(x, expression, modules=['numpy'], cse=True)
+    # lambdify registers the generated source in linecache, which is never evicted; drop it so
+    # that keeping many expressions over a long session doesn't grow memory
+    linecache.cache.pop(curve_function.__code__.co_filename, None)
+    return curve_function
+
+# Function to generate the light cones (x=t and x=-t lines, drawn from their endpoints);
+# velocity-independent, so cached like the reference grid
+@st.cache_data
+def generate_light_cones():
+    light_cones = [
+        go.Scattergl(x=axis_range, y=axis_range, mode="lines", line=dict(dash="dash", color="green"), name="Light cone (x = t)"),
+        go.Scattergl(x=axis_range, y=-axis_range, mode="lines", line=dict(dash="dash", color="green"), name="Light cone (x = -t)")
+    ]
+    return [trace.to_plotly_json() for trace in light_cones]
+
 # Points data
 if 'points' not in st.session_state:
     st.session_state['points'] = {}  # Dictionary to store points by coordinates (x, t): color
@@ -93,10 +199,11 @@ if st.sidebar.button("Add/Update Point"):
 
 # Dropdown to select and remove points
 st.sidebar.subheader("Remove Points")
-point_to_remove = st.sidebar.selectbox("Select a point to remove", [(x, t) for (x, t) in st.session_state['points']])
+point_to_remove = st.sidebar.selectbox("Select a point to remove", list(st.session_state['points']))
 if st.sidebar.button("Remove Selected Point"):
-    if (point_to_remove[0], point_to_remove[1]) in st.session_state['points']:
-        del st.session_state['points'][(point_to_remove[0], point_to_remove[1])]
+    # The selected option is the (x, t) key itself, so removal is a single hashed lookup
+    # (None when there are no points to choose from)
+    st.session_state['points'].pop(point_to_remove, None)
 
 # Button to clear all points
 if st.sidebar.button("Clear All Points"):
@@ -105,12 +212,14 @@ if st.sidebar.button("Clear All Points"):
 # Custom alignment of points
 st.sidebar.subheader("Align Points with Time Axis")
 if len(st.session_state['points']) >= 2:
-    points_list = [(i, f"Point {i+1} ({x}, {t})") for i, (x, t) in enumerate(st.session_state['points'].keys())]
+    # The points dict is both insertion-ordered and hashed, so one key list serves display and lookup
+    point_keys = list(st.session_state['points'])
+    points_list = [(i, f"Point {i+1} ({x}, {t})") for i, (x, t) in enumerate(point_keys)]
     selected_points = st.sidebar.multiselect("Select two points to align:", points_list, max_selections=2)
     
     if len(selected_points) == 2:
         index1, index2 = selected_points[0][0], selected_points[1][0]
-        (x1, t1), (x2, t2) = list(st.session_state['points'].keys())[index1], list(st.session_state['points'].keys())[index2]
+        (x1, t1), (x2, t2) = point_keys[index1], point_keys[index2]
         
         # Calculate the required velocity to align selected points vertically
         def calculate_velocity_for_alignment(x1, t1, x2, t2):
@@ -133,6 +242,12 @@ if len(st.session_state['points']) >= 2:
             st.write(f"Calculated alignment velocity: {align_velocity:.2f}c")
             velocity = align_velocity
 
+# Quantize the final velocity once, so the grid cache key, the title and every transform below use the
+# same float and the cached grid always matches the points (4 decimals keeps computed alignment
+# velocities visually exact), then compute the Lorentz factor shared by all transforms
+velocity = round(velocity, 4)
+gamma = lorentz_factor(velocity)
+
 # Curve plotting section with enable option
 enable_curve = st.sidebar.checkbox("Enable Curve Plotting")
 if enable_curve:
@@ -140,58 +255,93 @@ if enable_curve:
     curve_expr = st.sidebar.text_input("Enter curve expression in terms of x (e.g., x**2 + 2*x + 3)", "x**2")
     curve_color = st.sidebar.color_picker("Choose Curve Color", "#FF00FF")
 
-    # Define symbols
-    x = symbols('x')
-
     # Try to generate the curve
     try:
         if curve_expr.strip():  # Only try if there's an input
-            # Convert the user input to a sympy expression and create a lambda function for it
-            curve_function = lambdify(x, sympify(curve_expr), modules=['numpy'])
-            x_vals = np.linspace(-5, 5, 100)
+            # Convert the user input to a sympy expression and compile it to a NumPy function
+            curve_function = compile_curve(curve_expr)
+            x_vals = curve_range
             y_vals = curve_function(x_vals)
-            
-            # Apply Lorentz transformation to curve points
-            t_transformed, x_transformed = lorentz_transform(y_vals, x_vals, velocity)
+            if np.iscomplexobj(y_vals):
+                raise ValueError("the expression takes complex values")
 
-            # Plot the transformed curve
-            curve_trace = go.Scatter(x=x_transformed, y=t_transformed, mode="lines", line=dict(color=curve_color, width=2), name="Transformed Curve")
+            # Curve samples (t = y, x), Lorentz-transformed together with the axes and points below;
+            # constant expressions are broadcast to one value per sample
+            curve_samples = (np.broadcast_to(np.asarray(y_vals, dtype=float), x_vals.shape), x_vals)
         else:
-            curve_trace = None
+            curve_samples = None
     except Exception as e:
         st.error(f"Could not plot curve '{curve_expr}': {e}")
-        curve_trace = None
+        curve_samples = None
 else:
-    curve_trace = None  # Disable curve plotting if unchecked
-
-# Generate plot data with transformed grid and reference grid
-plot_data = generate_reference_grid() + generate_transformed_grid_lines(velocity) + generate_transformed_axes(velocity)
-
-# Add the curve if successfully created
-if curve_trace:
-    plot_data.append(curve_trace)
-
-# Transform and plot each point with its color
-for (x_point, t_point), color in st.session_state['points'].items():
-    t_transformed, x_transformed = lorentz_transform(t_point, x_point, velocity)
-    plot_data.append(go.Scatter(x=[x_transformed], y=[t_transformed], mode="markers", marker=dict(color=color, size=10), showlegend=False))
-
-# Add light cones (x=t and x=-t lines)
-time_range = np.linspace(-5, 5, 100)
-plot_data.append(go.Scatter(x=time_range, y=time_range, mode="lines", line=dict(dash="dash", color="green"), name="Light cone (x = t)"))
-plot_data.append(go.Scatter(x=time_range, y=-time_range, mode="lines", line=dict(dash="dash", color="green"), name="Light cone (x = -t)"))
-
-# Configure Plotly layout
-layout = go.Layout(
-    xaxis=dict(title="Space (x)", range=[-5, 5], fixedrange=False),
-    yaxis=dict(title="Time (t)", range=[-5, 5], fixedrange=False),
-    title=f"Lorentz Transformation with Relative Velocity = {velocity:.2f}c",
-    dragmode="pan"
-)
+    curve_samples = None  # Disable curve plotting if unchecked
+
+# Points and velocity the points trace in the session figure was last drawn for; when neither changed
+# (e.g. only the curve was edited) that trace is still current, so the points are not transformed again
+points_key = (tuple(sorted(st.session_state['points'].items())), velocity)
+points_changed = 'figure' not in st.session_state or st.session_state.get('points_key') != points_key
+
+# Velocity and curve the session figure was last drawn for. If these and the points are unchanged,
+# the figure is already current and the updates below are skipped (e.g. on point-input reruns).
+curve_key = (curve_expr, curve_color) if curve_samples is not None else None
+figure_key = (velocity, curve_key)
+if points_changed or st.session_state.get('figure_key') != figure_key:
+    # Every velocity-dependent coordinate outside the cached grid (axis endpoints, curve, points)
+    # is Lorentz-transformed in one fused call
+    segments = {'t_axis': (axis_range, axis_zeros), 'x_axis': (axis_zeros, axis_range)}
+    if curve_samples is not None:
+        segments['curve'] = curve_samples
+    if st.session_state['points'] and points_changed:
+        points_xt = np.array(list(st.session_state['points']), dtype=float)
+        segments['points'] = (points_xt[:, 1], points_xt[:, 0])
+    transformed = transform_segments(segments, velocity, gamma)
+
+    # Generate plot data with transformed grid and transformed axes
+    # (velocity is already quantized, so equal positions share one cache entry)
+    transformed_traces = generate_transformed_grid_lines(velocity) + generate_transformed_axes(transformed['t_axis'], transformed['x_axis'])
+
+    # The figure is kept in session state with a fixed set of traces, so the static reference grid,
+    # light cones and layout are built and validated once; each rerun only updates the other traces.
+    # The trace order never changes and uirevision is constant, so Plotly.react matches traces by index
+    # and keeps the user's zoom and pan across reruns.
+    if 'figure' not in st.session_state:
+        st.session_state['figure'] = go.Figure(
+            data=generate_reference_grid() + transformed_traces + [
+                go.Scattergl(x=[], y=[], mode="lines", line=dict(width=2), name="Transformed Curve", visible=False, uid='curve'),
+                go.Scattergl(x=[], y=[], mode="markers", marker=dict(size=10), showlegend=False, uid='points')
+            ] + generate_light_cones(),
+            layout=go.Layout(
+                xaxis=dict(title="Space (x)", range=[-5, 5], fixedrange=False),
+                yaxis=dict(title="Time (t)", range=[-5, 5], fixedrange=False),
+                dragmode="pan",
+                uirevision='static'
+            )
+        )
+    fig = st.session_state['figure']
+
+    for trace in transformed_traces:
+        fig.update_traces(x=trace['x'], y=trace['y'], selector=dict(uid=trace['uid']))
+
+    # Show the curve if successfully created, hide its trace otherwise
+    if 'curve' in transformed:
+        t_transformed, x_transformed = transformed['curve']
+        fig.update_traces(x=x_transformed, y=t_transformed, line=dict(color=curve_color), visible=True, selector=dict(uid='curve'))
+    else:
+        fig.update_traces(x=[], y=[], visible=False, selector=dict(uid='curve'))
+
+    # Plot all points as a single markers trace with per-point colors
+    if 'points' in transformed:
+        t_transformed, x_transformed = transformed['points']
+        points_colors = list(st.session_state['points'].values())
+        fig.update_traces(x=x_transformed, y=t_transformed, marker=dict(color=points_colors), selector=dict(uid='points'))
+    elif points_changed:
+        fig.update_traces(x=[], y=[], selector=dict(uid='points'))
+    st.session_state['points_key'], st.session_state['figure_key'] = points_key, figure_key
+
+    fig.layout.title.text = f"Lorentz Transformation with Relative Velocity = {velocity:.2f}c"
 
 # Display plot in Streamlit
-fig = go.Figure(data=plot_data, layout=layout)
-st.plotly_chart(fig, use_container_width=True, config={"scrollZoom": True})
+st.plotly_chart(st.session_state['figure'], use_container_width=True, config={"scrollZoom": True})
 
 # Explanation
 st.write("## Lorentz Transformation Tool with Optional Curve Plotting")